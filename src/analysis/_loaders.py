@@ -0,0 +1,115 @@
+"""
+Shared CSV loading helpers for the human-coding / evaluation scripts
+(kappa_humans, diff_humans, evaluate_labels).
+
+load_coded_csv: one loader for coder / gold / model label CSVs -> DataFrame
+indexed by post id, with normalized label fields.
+
+parquet_cached: memoize a loader's normalized DataFrame on disk as Parquet,
+keyed by the input file's content hash, so repeat kappa/diff/evaluate runs
+during adjudication skip CSV parsing and normalization.
+"""
+
+import functools
+import hashlib
+import sys
+from pathlib import Path
+
+import pandas as pd
+
+from _norm import norm_bool_series, norm_cat_series
+
+CACHE_DIR = Path("data/interim/.cache")
+# bump when parsing/normalization rules change so stale cache entries are ignored
+CACHE_VERSION = 2
+
+
+def _stable(v):
+    # sets repr in hash order, which changes between processes; sort them for the key
+    if isinstance(v, (set, frozenset)):
+        return sorted(v)
+    if isinstance(v, (list, tuple)):
+        return [_stable(x) for x in v]
+    return v
+
+
+def _cache_path(fn, path: Path, args, kwargs) -> Path:
+    h = hashlib.sha1(Path(path).read_bytes())
+    key = (CACHE_VERSION, fn.__module__, fn.__qualname__, _stable(args), sorted((k, _stable(v)) for k, v in kwargs.items()))
+    h.update(repr(key).encode("utf-8"))
+    return CACHE_DIR / f"{h.hexdigest()}.parquet"
+
+
+def parquet_cached(fn):
+    """Decorate `fn(path, *args, **kwargs) -> DataFrame` with a Parquet cache under CACHE_DIR.
+
+    Falls back to calling `fn` directly when no Parquet engine (pyarrow) is installed
+    or the cache can't be read/written.
+    """
+    @functools.wraps(fn)
+    def wrapper(path, *args, **kwargs):
+        try:
+            cache = _cache_path(fn, path, args, kwargs)
+            if cache.exists():
+                return pd.read_parquet(cache)
+        except (ImportError, OSError, ValueError, TypeError):
+            return fn(path, *args, **kwargs)
+
+        df = fn(path, *args, **kwargs)
+        try:
+            cache.parent.mkdir(parents=True, exist_ok=True)
+            tmp = cache.with_suffix(".tmp")
+            df.to_parquet(tmp, compression="zstd")
+            tmp.replace(cache)
+        except ImportError:
+            pass  # no Parquet engine installed; caching is optional
+        except (OSError, ValueError, TypeError) as e:
+            print(f"[warn] could not write cache {cache}: {e}")
+        return df
+    return wrapper
+
+
+def load_coded_csv(path: Path, fields, bool_fields, context_cols=(), id_cols=("post_id", "id"), missing=""):
+    """
+    Read a coded CSV -> DataFrame[fields + context_cols] indexed by post id.
+
+    - fields: normalized (bool_fields -> "true"/"false"/"", others stripped + lowercased);
+      a field absent from the CSV is filled with `missing`
+    - context_cols: kept raw (UNTRIMMED); absent ones are ""
+    - id: first non-empty of id_cols; rows without one are dropped, last duplicate wins
+      (ids are interned, so both coders' frames share one str object per post)
+    """
+    df = _read_coded_csv(path, fields, bool_fields, context_cols, id_cols, missing)
+    df.index = pd.Index([sys.intern(p) for p in df.index], dtype=object)
+    return df
+
+
+@parquet_cached
+def _read_coded_csv(path: Path, fields, bool_fields, context_cols, id_cols, missing):
+    fields, context_cols = list(fields), list(context_cols)
+    wanted = set(fields) | set(context_cols) | set(id_cols)
+    # index_col=False: a row with a trailing comma must not turn post_id into the index
+    df = pd.read_csv(path, usecols=lambda c: c in wanted, dtype=str, index_col=False,
+                     keep_default_na=False, encoding="utf-8", engine="c").fillna("")
+
+    # vectorized normalization, one column at a time
+    present = [f for f in fields if f in df]
+    bool_cols = [f for f in present if f in bool_fields]
+    cat_cols = [f for f in present if f not in bool_fields]
+    if bool_cols:
+        df[bool_cols] = df[bool_cols].apply(norm_bool_series)
+    if cat_cols:
+        df[cat_cols] = df[cat_cols].apply(norm_cat_series)
+    for f in fields:
+        if f not in df:
+            df[f] = missing
+    for c in context_cols:
+        if c not in df:
+            df[c] = ""
+
+    pid = pd.Series("", index=df.index)
+    for c in id_cols:
+        if c in df:
+            pid = pid.where(pid != "", df[c])
+    df = df[fields + context_cols].set_index(pid)[pid.values != ""]
+    return df[~df.index.duplicated(keep="last")]
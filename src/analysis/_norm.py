@@ -0,0 +1,59 @@
+"""
+Shared label normalization for the human-coding / evaluation scripts
+(kappa_humans, diff_humans, evaluate_labels).
+
+Booleans normalize to "true" / "false", anything else (blank/unknown) to "",
+which the scripts treat as missing. Categories are stripped and lowercased.
+"""
+
+from functools import lru_cache
+
+import pandas as pd
+
+_TRUE_WORDS = ("true", "1", "yes", "y")
+_FALSE_WORDS = ("false", "0", "no", "n")
+
+# Every common casing maps straight to its canonical value, so the usual
+# spreadsheet spellings ("TRUE", "Yes", ...) resolve with a single dict hit.
+BOOL_LUT: dict[str, str] = {}
+for _canon, _words in (("true", _TRUE_WORDS), ("false", _FALSE_WORDS)):
+    for _w in _words:
+        for _v in (_w, _w.upper(), _w.capitalize()):
+            BOOL_LUT[_v] = _canon
+
+
+def norm_bool(x: str) -> str:
+    if not x:
+        return ""
+    # canonical / common spellings resolve without any string ops
+    v = BOOL_LUT.get(x)
+    if v is not None:
+        return v
+    return BOOL_LUT.get(x.strip().lower(), "")
+
+
+@lru_cache(maxsize=4096)
+def _norm_cat_slow(x: str) -> str:
+    # categorical vocabularies are tiny and repeat heavily, so this is mostly cache hits
+    return x.strip().lower()
+
+
+def norm_cat(x: str) -> str:
+    if not x:
+        return ""
+    # already canonical (the usual case): str.strip() returns x itself, no allocation
+    if x.islower() and x.strip() is x:
+        return x
+    return _norm_cat_slow(x)
+
+
+def norm_bool_series(s: pd.Series) -> pd.Series:
+    out = s.map(BOOL_LUT)
+    miss = out.isna()
+    if miss.any():
+        out[miss] = s[miss].str.strip().str.lower().map(BOOL_LUT)
+    return out.fillna("")
+
+
+def norm_cat_series(s: pd.Series) -> pd.Series:
+    return s.str.strip().str.lower()
@@ -27,15 +27,21 @@ python src/analysis/diff_humans.py \
 Outputs (to --out-dir, default: reports/diffs):
 - diff_summary.csv              (per-field counts and % disagreement)
 - diff_details.csv              (row-wise disagreements with full context columns)
-- confusions_<field>.csv        (per-field A→B pair frequencies)
+- confusions_<field>.csv        (per-field A→B disagreement pair frequencies)
 - orphans_A.csv / orphans_B.csv (IDs present only in one file), if any
 """
 
 import csv
+import sys
 import argparse
 from pathlib import Path
 from collections import Counter, defaultdict
 
+import pandas as pd
+
+from _loaders import load_coded_csv
+from _norm import norm_bool, norm_cat
+
 # ---------- Default target fields (same family as kappa_humans) ----------
 FIELDS_DEFAULT = [
     "is_injury_event",
@@ -47,47 +53,25 @@ FIELDS_DEFAULT = [
 ]
 BOOL_FIELDS = {"is_injury_event", "er_or_hospital_mentioned"}
 
-# ---------- Normalization (mirror kappa_humans behavior) ----------
-def _norm_bool(x: str) -> str:
-    s = (x or "").strip().lower()
-    if s in {"true", "1", "yes", "y"}:
-        return "true"
-    if s in {"false", "0", "no", "n"}:
-        return "false"
-    return ""  # treat unknown/blank as missing for blanks-only logic
-
-def _norm_cat(x: str) -> str:
-    return (x or "").strip().lower()
-
-# ---------- IO ----------
-def load_by_post_id(path: Path, fields: list[str], context_cols: list[str]) -> dict[str, dict]:
-    """Return dict[post_id] -> { field: normalized_value, <context cols>: original (UNTRIMMED) }"""
-    data: dict[str, dict] = {}
-    with open(path, "r", encoding="utf-8") as fp:
-        r = csv.DictReader(fp)
-        for row in r:
-            pid = row.get("post_id") or row.get("id")
-            if not pid:
-                continue
-            rec = {}
-            # normalized fields
-            for f in fields:
-                val = row.get(f, "")
-                if f in BOOL_FIELDS:
-                    rec[f] = _norm_bool(val)
-                else:
-                    rec[f] = _norm_cat(val)
-            # raw context (full text, no trimming)
-            for c in context_cols:
-                rec[c] = row.get(c, "")
-            data[pid] = rec
-    return data
+# ---------- IO (normalization shared with kappa_humans via _norm) ----------
+def load_by_post_id(path: Path, fields: list[str], context_cols: list[str]) -> dict[str, tuple]:
+    """Return dict[post_id] -> (normalized values in `fields` order..., original (UNTRIMMED) context values...)"""
+    df = load_coded_csv(path, fields, BOOL_FIELDS, context_cols)
+    return dict(zip(df.index, df.itertuples(index=False, name=None)))
+
+def _cell(row: list[str], i) -> str:
+    """Value at column index i, or "" when the column is absent or the row is short."""
+    return row[i] if i is not None and i < len(row) else ""
 
 # ---------- Main diff logic ----------
-def diff_coders(A: dict, B: dict, fields: list[str], ignore_blanks: bool, context_cols: list[str]):
-    common = sorted(set(A.keys()) & set(B.keys()))
-    only_A = sorted(set(A.keys()) - set(B.keys()))
-    only_B = sorted(set(B.keys()) - set(A.keys()))
+def diff_coders(path_A: Path, B: dict, fields: list[str], ignore_blanks: bool,
+                context_cols: list[str], out_dir: Path):
+    """
+    Stream coder A one row at a time against B (from load_by_post_id) and write
+    diff_details.csv as disagreements are found, so only B is held in memory.
+    """
+    n_fields = len(fields)
+    is_bool = [f in BOOL_FIELDS for f in fields]
 
     # per-field confusion counts: (a_val, b_val) -> count
     confusions: dict[str, Counter] = {f: Counter() for f in fields}
@@ -95,37 +79,73 @@ def diff_coders(A: dict, B: dict, fields: list[str], ignore_blanks: bool, contex
     compared = defaultdict(int)
     disagreed = defaultdict(int)
 
-    # detailed rows
-    details_rows = []
+    # the streaming pass over A partitions ids: matched in B (counted), only in A (listed),
+    # and only in B (B's keys never seen in A, one C-level set difference at the end)
+    n_common, only_A = 0, []
+    n_details = 0
 
-    for pid in common:
-        recA, recB = A[pid], B[pid]
-        for f in fields:
-            va, vb = recA.get(f, ""), recB.get(f, "")
-            if ignore_blanks and (va == "" or vb == ""):
+    out_dir.mkdir(parents=True, exist_ok=True)
+    details_path = out_dir / "diff_details.csv"
+    # a post_id repeated in A keeps its last row (as B's dict does): a cheap first pass that
+    # only splits ids finds each id's last line, and the streaming pass compares just those
+    with open(path_A, "r", newline="", encoding="utf-8") as fp:
+        r = csv.reader(fp)
+        header = next(r, [])
+        col = {name: i for i, name in enumerate(header)}
+        pid_i, id_i = col.get("post_id"), col.get("id")
+        last_row = {}
+        for n, row in enumerate(r):
+            pid = _cell(row, pid_i) or _cell(row, id_i)
+            if pid:
+                last_row[pid] = n
+
+    with open(path_A, "r", newline="", encoding="utf-8") as fp, \
+         open(details_path, "w", newline="", encoding="utf-8") as out:
+        r = csv.reader(fp)
+        next(r, [])
+        field_idx = [col.get(f) for f in fields]
+        context_idx = [col.get(c) for c in context_cols]
+
+        w = csv.writer(out)
+        w.writerow(["post_id", "field", "coder_a", "coder_b"] + context_cols)
+
+        for n, row in enumerate(r):
+            pid = _cell(row, pid_i) or _cell(row, id_i)
+            if not pid or last_row[pid] != n:
                 continue
-
-            compared[f] += 1
-            if va != vb:
-                disagreed[f] += 1
-                row = {
-                    "post_id": pid,
-                    "field": f,
-                    "coder_a": va,
-                    "coder_b": vb,
-                }
-                # include full context columns (untrimmed). Prefer A's value; fall back to B's if empty.
-                for c in context_cols:
-                    row[c] = recA.get(c, "") if recA.get(c, "") != "" else recB.get(c, "")
-                details_rows.append(row)
-
-            confusions[f][(va, vb)] += 1
+            pid = sys.intern(pid)
+            recB = B.get(pid)
+            if recB is None:
+                only_A.append(pid)
+                continue
+            n_common += 1
+
+            for j, f in enumerate(fields):
+                raw = _cell(row, field_idx[j])
+                va = norm_bool(raw) if is_bool[j] else norm_cat(raw)
+                vb = recB[j]
+                if ignore_blanks and (va == "" or vb == ""):
+                    continue
+
+                compared[f] += 1
+                if va != vb:
+                    disagreed[f] += 1
+                    # include full context columns (untrimmed). Prefer A's value; fall back to B's if empty.
+                    ctx = [_cell(row, i) for i in context_idx]
+                    ctx = [a if a != "" else b for a, b in zip(ctx, recB[n_fields:])]
+                    w.writerow([pid, f, va, vb] + ctx)
+                    n_details += 1
+                    # off-diagonal only; agreements are compared - disagreed
+                    confusions[f][(va, vb)] += 1
+
+    only_B = sorted(B.keys() - last_row.keys())
 
     return {
-        "common": common,
-        "only_A": only_A,
+        "n_common": n_common,
+        "only_A": sorted(only_A),
         "only_B": only_B,
-        "details": details_rows,
+        "details_path": details_path,
+        "n_details": n_details,
         "compared": dict(compared),
         "disagreed": dict(disagreed),
         "confusions": confusions,
@@ -146,24 +166,16 @@ def write_summary(out_dir: Path, compared: dict, disagreed: dict):
             w.writerow({"field": f, "n_compared": n, "n_disagreed": d, "pct_disagree": f"{pct:.2f}"})
     return out
 
-def write_details(out_dir: Path, details_rows: list[dict], context_cols: list[str]):
-    out = out_dir / "diff_details.csv"
-    fields = ["post_id", "field", "coder_a", "coder_b"] + context_cols
-    with open(out, "w", newline="", encoding="utf-8") as fp:
-        w = csv.DictWriter(fp, fieldnames=fields)
-        w.writeheader()
-        w.writerows(details_rows)
-    return out
-
 def write_confusions(out_dir: Path, confusions: dict[str, Counter]):
     paths = {}
     for f, counter in confusions.items():
         out = out_dir / f"confusions_{f}.csv"
-        with open(out, "w", newline="", encoding="utf-8") as fp:
-            w = csv.DictWriter(fp, fieldnames=["coder_a_value", "coder_b_value", "count"])
-            w.writeheader()
-            for (va, vb), cnt in counter.most_common():
-                w.writerow({"coder_a_value": va, "coder_b_value": vb, "count": cnt})
+        # one bulk write via pandas' C writer; stable sort keeps most_common()'s tie order
+        df = pd.DataFrame(
+            [(va, vb, cnt) for (va, vb), cnt in counter.items()],
+            columns=["coder_a_value", "coder_b_value", "count"],
+        ).sort_values("count", ascending=False, kind="stable")
+        df.to_csv(out, index=False, encoding="utf-8", lineterminator="\r\n")  # same as csv.writer
         paths[f] = out
     return paths
 
@@ -204,20 +216,20 @@ def parse_args():
 def main():
     args = parse_args()
     out_dir = Path(args.out_dir)
-    fields = [f.strip() for f in args.fields.split(",") if f.strip()]
+    fields = [sys.intern(f.strip()) for f in args.fields.split(",") if f.strip()]
     context_cols = [c.strip() for c in args.context.split(",") if c.strip()]
 
-    A = load_by_post_id(Path(args.coder_a), fields, context_cols)
+    # Only coder B is loaded; coder A is streamed against it
     B = load_by_post_id(Path(args.coder_b), fields, context_cols)
 
-    res = diff_coders(A, B, fields, args.ignore_blanks, context_cols)
+    res = diff_coders(Path(args.coder_a), B, fields, args.ignore_blanks, context_cols, out_dir)
 
     out_summary = write_summary(out_dir, res["compared"], res["disagreed"])
-    out_details = write_details(out_dir, res["details"], context_cols)
+    out_details = res["details_path"]
     out_conf = write_confusions(out_dir, res["confusions"])
     out_orphans = write_orphans(out_dir, res["only_A"], res["only_B"])
 
-    print(f"Compared posts (overlap): {len(res['common'])}")
+    print(f"Compared posts (overlap): {res['n_common']}")
     print(f"Only in A: {len(res['only_A'])} | Only in B: {len(res['only_B'])}")
     print("\nPer-field disagreement:")
     for f in fields:
@@ -26,6 +26,7 @@ import csv
 from pathlib import Path
 import argparse
 
+import pandas as pd
 from sklearn.metrics import (
     accuracy_score,
     precision_recall_fscore_support,
@@ -34,6 +35,8 @@ from sklearn.metrics import (
     classification_report,
 )
 
+from _loaders import load_coded_csv
+
 EVAL_FIELDS = [
     "is_injury_event",
     "mechanism_of_injury",
@@ -45,48 +48,12 @@ EVAL_FIELDS = [
 
 BOOL_FIELDS = {"is_injury_event", "er_or_hospital_mentioned"}
 
-def norm_bool(x: str) -> str:
-    s = (x or "").strip().lower()
-    if s in {"true","1","yes","y"}: return "true"
-    if s in {"false","0","no","n"}: return "false"
-    return ""  # treat missing/unknown as empty
-
-def norm_cat(x: str) -> str:
-    return (x or "").strip().lower()
-
-def load_gold(path: Path) -> dict:
-    gold = {}
-    with open(path, "r", encoding="utf-8") as fp:
-        r = csv.DictReader(fp)
-        for row in r:
-            pid = row.get("post_id")
-            if not pid:
-                continue
-            rec = {}
-            for f in EVAL_FIELDS:
-                v = row.get(f, "")
-                rec[f] = norm_bool(v) if f in BOOL_FIELDS else norm_cat(v)
-            gold[pid] = rec
-    return gold
-
-def load_model(path: Path) -> dict:
-    model = {}
-    with open(path, "r", encoding="utf-8") as fp:
-        r = csv.DictReader(fp)
-        model_cols = set(r.fieldnames or [])
-        for row in r:
-            pid = row.get("post_id") or row.get("id")
-            if not pid:
-                continue
-            rec = {}
-            for f in EVAL_FIELDS:
-                if f not in model_cols:
-                    rec[f] = None  # field absent in model CSV
-                    continue
-                v = row.get(f, "")
-                rec[f] = norm_bool(v) if f in BOOL_FIELDS else norm_cat(v)
-            model[pid] = rec
-    return model
+def load_gold(path: Path) -> pd.DataFrame:
+    return load_coded_csv(path, EVAL_FIELDS, BOOL_FIELDS, id_cols=("post_id",))
+
+def load_model(path: Path) -> pd.DataFrame:
+    # None marks a field absent in the model CSV (vs "" for a blank label)
+    return load_coded_csv(path, EVAL_FIELDS, BOOL_FIELDS, id_cols=("post_id", "id"), missing=None)
 
 def write_confusion_matrix_csv(out_path: Path, labels, cm):
     out_path.parent.mkdir(parents=True, exist_ok=True)
@@ -108,8 +75,9 @@ def main():
     gold  = load_gold(Path(args.gold))
     model = load_model(Path(args.model))
 
-    common = sorted(set(gold.keys()) & set(model.keys()))
-    if not common:
+    # posts labelled by both sides; every field is scored from this one frame
+    merged = gold.join(model, lsuffix="_gold", rsuffix="_model", how="inner")
+    if merged.empty:
         raise SystemExit("No overlapping post IDs between gold and model.")
 
     summary_path = outdir / "summary.csv"
@@ -119,11 +87,12 @@ def main():
         ])
         wsum.writeheader()
 
-        print(f"Evaluating on {len(common)} overlapping posts\n")
+        print(f"Evaluating on {len(merged)} overlapping posts\n")
 
         for field in EVAL_FIELDS:
+            gt, mp = merged[f"{field}_gold"], merged[f"{field}_model"]
             # Skip entire field if it's missing from the model CSV
-            if all(model[pid].get(field) is None for pid in common):
+            if mp.isna().all():
                 note = "skipped (field missing in model CSV)"
                 print(f"{field:>24}: {note}")
                 wsum.writerow({
@@ -133,13 +102,9 @@ def main():
                 })
                 continue
 
-            y_true, y_pred = [], []
-            for pid in common:
-                gt = gold[pid].get(field, "")
-                mp = model[pid].get(field, None)
-                if mp is None or gt == "" or mp == "":
-                    continue  # pairwise skip for blanks
-                y_true.append(gt); y_pred.append(mp)
+            mask = mp.notna() & (gt != "") & (mp != "")  # pairwise skip for blanks
+            y_true = gt[mask].to_numpy()
+            y_pred = mp[mask].to_numpy()
 
             n = len(y_true)
             if n == 0:
@@ -17,8 +17,11 @@ Usage:
 import csv
 import argparse
 from pathlib import Path
+import pandas as pd
 from sklearn.metrics import cohen_kappa_score
 
+from _loaders import load_coded_csv
+
 # Fields to evaluate (exclude rationale_short, coder_id)
 FIELDS = [
     "is_injury_event",
@@ -31,32 +34,9 @@ FIELDS = [
 
 BOOL_FIELDS = {"is_injury_event", "er_or_hospital_mentioned"}
 
-def _norm_bool(x: str) -> str:
-    s = (x or "").strip().lower()
-    if s in {"true","1","yes","y"}: return "true"
-    if s in {"false","0","no","n"}: return "false"
-    return ""  # treat unknown/blank as missing
-
-def _norm_cat(x: str) -> str:
-    return (x or "").strip().lower()
-
-def load_annotations(path: Path) -> dict:
-    data = {}
-    with open(path, "r", encoding="utf-8") as fp:
-        r = csv.DictReader(fp)
-        for row in r:
-            pid = row.get("post_id") or row.get("id")
-            if not pid:
-                continue
-            rec = {}
-            for f in FIELDS:
-                val = row.get(f, "")
-                if f in BOOL_FIELDS:
-                    rec[f] = _norm_bool(val)
-                else:
-                    rec[f] = _norm_cat(val)
-            data[pid] = rec
-    return data
+def load_annotations(path: Path) -> pd.DataFrame:
+    """Return FIELDS (normalized) indexed by post_id (falling back to id)"""
+    return load_coded_csv(path, FIELDS, BOOL_FIELDS)
 
 def main():
     ap = argparse.ArgumentParser(description="Compute Cohen's kappa between two human coder CSVs.")
@@ -69,22 +49,20 @@ def main():
     A = load_annotations(Path(args.coder_a))
     B = load_annotations(Path(args.coder_b))
 
-    common = sorted(set(A.keys()) & set(B.keys()))
-    if not common:
+    # one join on post_id instead of a per-post loop for every field
+    merged = A.join(B, lsuffix="_a", rsuffix="_b", how="inner")
+    if merged.empty:
         raise SystemExit("No overlapping post_id between the two CSVs.")
 
-    print(f"Comparing {len(common)} posts\n")
+    print(f"Comparing {len(merged)} posts\n")
 
     rows_out = []
     for field in FIELDS:
-        y_true, y_pred = [], []
-        for pid in common:
-            va, vb = A[pid].get(field, ""), B[pid].get(field, "")
-            # skip if either coder left blank/unknown for this field
-            if va == "" or vb == "":
-                continue
-            y_true.append(va)
-            y_pred.append(vb)
+        va, vb = merged[f"{field}_a"], merged[f"{field}_b"]
+        # skip if either coder left blank/unknown for this field
+        mask = (va != "") & (vb != "")
+        y_true = va[mask].to_numpy()
+        y_pred = vb[mask].to_numpy()
 
         n = len(y_true)
         if n == 0:
@@ -93,7 +71,7 @@ def main():
             print(f"{field:>22}:  kappa=nan  agreement=nan  n=0 (no overlapping non-empty labels)")
         else:
             kappa = cohen_kappa_score(y_true, y_pred)
-            agreement = sum(1 for i in range(n) if y_true[i] == y_pred[i]) / n
+            agreement = float((y_true == y_pred).mean())
             print(f"{field:>22}:  kappa={kappa:.3f}  agreement={agreement:.3f}  n={n}")
 
         rows_out.append({"field": field, "kappa": kappa, "agreement": agreement, "n": n})
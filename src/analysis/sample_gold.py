@@ -1,8 +1,14 @@
 #!/usr/bin/env python3
-import json, csv, random, gzip, math
+import csv, random, gzip, math, os
+from itertools import islice
 from pathlib import Path
 import argparse
 
+try:
+    import orjson as _json  # optional, much faster loads; same API for what we use
+except ImportError:
+    import json as _json
+
 # CSV columns for annotators
 COLUMNS = [
     "post_id","title","selftext","permalink","created_utc","subreddit",
@@ -11,14 +17,16 @@ COLUMNS = [
 ]
 
 def newest_raw_file(raw_dir: Path) -> Path:
-    candidates = list(raw_dir.glob("*.jsonl")) + list(raw_dir.glob("*.jsonl.gz"))
+    with os.scandir(raw_dir) as it:
+        candidates = [e for e in it if e.name.endswith((".jsonl", ".jsonl.gz")) and e.is_file()]
     if not candidates:
         raise FileNotFoundError(f"No .jsonl/.jsonl.gz files found in {raw_dir}")
-    candidates.sort(key=lambda p: p.stat().st_mtime, reverse=True)
-    return candidates[0]
+    newest = max(candidates, key=lambda e: e.stat().st_mtime)
+    return Path(newest.path)
 
 def open_maybe_gzip(path: Path):
-    return gzip.open(path, "rt", encoding="utf-8") if path.suffix == ".gz" else open(path, "r", encoding="utf-8")
+    # bytes mode: orjson parses UTF-8 bytes directly, and raw lines are copied through undecoded
+    return gzip.open(path, "rb") if path.suffix == ".gz" else open(path, "rb")
 
 def stem_for_output(p: Path) -> str:
     name = p.name
@@ -26,6 +34,51 @@ def stem_for_output(p: Path) -> str:
     if name.endswith(".jsonl"):    return name[:-6]
     return p.stem
 
+def iter_lines(path: Path):
+    """Yield non-blank raw lines (unparsed bytes) from a .jsonl/.jsonl.gz file."""
+    with open_maybe_gzip(path) as f:
+        try:
+            for line in f:
+                if line.strip():
+                    yield line
+        except EOFError:
+            print(f"[warn] {path.name} ends in a truncated gzip member; stopped reading there")
+
+def count_lines(path: Path, chunk_size: int = 1 << 20) -> int:
+    """Count records by newlines in 1 MiB chunks (no per-line objects); a final unterminated line counts too."""
+    n, last = 0, b"\n"
+    with open_maybe_gzip(path) as f:
+        try:
+            while chunk := f.read(chunk_size):
+                n += chunk.count(b"\n")
+                last = chunk[-1:]
+        except EOFError:  # iter_lines reports the truncation
+            pass
+    return n + (last != b"\n")
+
+def reservoir_sample(items, k: int, rng: random.Random) -> list:
+    """Uniform sample of k items in one pass and O(k) memory (Li 1994, Algorithm L)."""
+    it = iter(items)
+    reservoir = list(islice(it, k))
+    if len(reservoir) < k:
+        return reservoir
+
+    def _u():
+        u = rng.random()
+        while u == 0.0:
+            u = rng.random()
+        return u
+
+    w = math.exp(math.log(_u()) / k)
+    while True:
+        # number of items to skip before the next one that enters the reservoir
+        skip = math.floor(math.log(_u()) / math.log1p(-w)) if w < 1.0 else 0
+        nxt = next(islice(it, skip, None), None)
+        if nxt is None:
+            return reservoir
+        reservoir[rng.randrange(k)] = nxt
+        w *= math.exp(math.log(_u()) / k)
+
 def main():
     ap = argparse.ArgumentParser(description="Sample 10% for annotation and write CSV + raw JSONL.GZ.")
     ap.add_argument("--in-jsonl", default=None, help="Optional explicit path; else newest in data/raw/")
@@ -41,23 +94,24 @@ def main():
         raise FileNotFoundError(f"Input not found: {in_path}")
     print(f"Using input: {in_path}")
 
-    # Load all posts
-    posts = []
-    with open_maybe_gzip(in_path) as f:
-        for line in f:
-            try:
-                posts.append(json.loads(line))
-            except json.JSONDecodeError:
-                pass
-
-    N = len(posts)
+    # Pass 1: count lines only (newline count; the crawler never writes blank lines);
+    # pass 2: reservoir-sample raw lines, so only the sampled lines are ever parsed
+    # and at most n_sample are held in memory
+    N = count_lines(in_path)
     if N == 0:
         raise SystemExit("No posts found in input.")
     n_sample = max(1, math.ceil(0.10 * N))
     print(f"Total posts: {N} -> sampling 10% = {n_sample}")
 
     rng = random.Random(args.seed)
-    sample = rng.sample(posts, n_sample)
+    sample_lines, sample = [], []
+    for line in reservoir_sample(iter_lines(in_path), n_sample, rng):
+        try:
+            sample.append(_json.loads(line))
+        except _json.JSONDecodeError:
+            continue
+        sample_lines.append(line if line.endswith(b"\n") else line + b"\n")
+    n_sample = len(sample)
 
     # Paths
     out_csv = Path(args.out_csv)
@@ -72,30 +126,20 @@ def main():
 
     # Write CSV for annotators
     with open(out_csv, "w", newline="", encoding="utf-8") as fp:
-        w = csv.DictWriter(fp, fieldnames=COLUMNS)
-        w.writeheader()
-        for p in sample:
-            w.writerow({
-                "post_id": p.get("id"),
-                "title": p.get("title"),
-                "selftext": p.get("selftext"),
-                "permalink": p.get("permalink"),
-                "created_utc": p.get("created_utc"),
-                "subreddit": p.get("subreddit"),
-                "is_injury_event": "",
-                "mechanism_of_injury": "",
-                "nature_of_injury": "",
-                "body_region": "",
-                "er_or_hospital_mentioned": "",
-                "age_group": "",
-                "rationale_short": "",
-                "coder_id": ""
-            })
-
-    # Write raw JSONL.GZ sample (exact original records)
-    with gzip.open(out_jsonl, "wt", encoding="utf-8") as gz:
-        for p in sample:
-            gz.write(json.dumps(p, ensure_ascii=False) + "\n")
+        w = csv.writer(fp)
+        w.writerow(COLUMNS)
+        # rows in COLUMNS order: six post fields, then blank coding columns for annotators
+        blanks = ("",) * (len(COLUMNS) - 6)
+        w.writerows(
+            (p.get("id"), p.get("title"), p.get("selftext"), p.get("permalink"),
+             p.get("created_utc"), p.get("subreddit")) + blanks
+            for p in sample
+        )
+
+    # Write raw JSONL.GZ sample (exact original records, written as read)
+    # level 1: this is an intermediate artifact, so trade a little size for much less CPU
+    with gzip.open(out_jsonl, "wb", compresslevel=1) as gz:
+        gz.writelines(sample_lines)
 
     print(f"Wrote {n_sample} rows to CSV: {out_csv}")
     print(f"Wrote {n_sample} raw posts to JSONL.GZ: {out_jsonl}")
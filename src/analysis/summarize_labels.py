@@ -21,15 +21,21 @@ Usage:
 """
 
 import argparse
+import os
 from pathlib import Path
 import csv
-from datetime import datetime, timezone
 
 try:
     import pandas as pd
 except ImportError as e:
     raise SystemExit("This script requires pandas. Try:  pip install pandas") from e
 
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pv  # optional: multi-threaded CSV reader, much faster on big label files
+except ImportError:
+    pa = pv = None
+
 # Fields written by your classifier
 EXPECTED = [
     "id","subreddit","created_utc","permalink","title",
@@ -37,43 +43,75 @@ EXPECTED = [
     "er_or_hospital_mentioned","age_group","rationale_short"
 ]
 
+# Enum fields (same vocabularies as the classifier); stored as categoricals after load
+ENUM_CATEGORIES = {
+    "mechanism_of_injury": [
+        "road_transport","fall","drowning","burn","scald","poisoning",
+        "choking_or_suffocation","foreign_body_ingestion","cut_pierce",
+        "struck_by_object","animal_related","other","unknown","not_applicable"
+    ],
+    "nature_of_injury": [
+        "fracture","laceration","contusion","burn","poisoning","asphyxiation",
+        "internal_injury","dental_injury","multiple","other","unknown","not_applicable"
+    ],
+    "body_region": [
+        "head_face","neck","torso","arm_hand","leg_foot","multiple","unknown","not_applicable"
+    ],
+    "age_group": [
+        "newborn","infant","toddler","preschool","child_unspecified","unknown","not_applicable"
+    ],
+}
+
 INTERIM_DIR = Path("data/interim")
 REPORT_DIR  = Path("reports/summaries")
 
 def newest_labels_file(interim: Path) -> Path:
-    candidates = sorted(interim.glob("*_labels.csv"), key=lambda p: p.stat().st_mtime, reverse=True)
+    with os.scandir(interim) as it:
+        candidates = [e for e in it if e.name.endswith("_labels.csv") and e.is_file()]
     if not candidates:
         raise FileNotFoundError(f"No *_labels.csv found in {interim}")
-    return candidates[0]
+    newest = max(candidates, key=lambda e: e.stat().st_mtime)
+    return Path(newest.path)
+
+_TRUE_WORDS = ["true","1","yes","y"]  # anything else (false/0/no/n/blank) → False
+_EPOCH = pd.Timestamp(0, tz="UTC")
+
+def read_labels_csv(path: Path) -> pd.DataFrame:
+    """All columns as plain str with no NA values (same result as read_csv(dtype=str, keep_default_na=False))."""
+    if pv is None:
+        return pd.read_csv(path, dtype=str, keep_default_na=False)
+    with open(path, newline="", encoding="utf-8-sig") as fp:
+        header = next(csv.reader(fp), [])
+    tbl = pv.read_csv(
+        path,
+        parse_options=pv.ParseOptions(newlines_in_values=True),  # titles/rationales may span lines
+        convert_options=pv.ConvertOptions(
+            column_types={c: pa.string() for c in header},
+            strings_can_be_null=False,
+        ),
+    )
+    return tbl.to_pandas()
 
 def load_labels(path: Path) -> pd.DataFrame:
-    df = pd.read_csv(path, dtype=str, keep_default_na=False)
-    # normalize basic types
+    df = read_labels_csv(path)
+    # normalize basic types (vectorized; no per-cell Python calls)
     # booleans may be 'true/false' or 'True/False' or blanks → map to True/False
-    def _to_bool(s: str) -> bool:
-        s = (s or "").strip().lower()
-        if s in {"true","1","yes","y"}:  return True
-        if s in {"false","0","no","n"}:  return False
-        return False  # safe default
-    df["is_injury_event"] = df.get("is_injury_event", "").apply(_to_bool)
-    df["er_or_hospital_mentioned"] = df.get("er_or_hospital_mentioned", "").apply(_to_bool)
-
-    # created_utc may be epoch seconds (int-like) or ISO string; try both
-    def _to_date(x):
-        s = str(x).strip()
-        if s.isdigit():
-            try:
-                dt = datetime.fromtimestamp(int(s), tz=timezone.utc)
-                return dt.date()
-            except Exception:
-                return None
-        # try ISO
-        try:
-            dt = datetime.fromisoformat(s.replace("Z","+00:00"))
-            return dt.date()
-        except Exception:
-            return None
-    df["created_date_utc"] = df.get("created_utc", "").apply(_to_date)
+    for col in ("is_injury_event", "er_or_hospital_mentioned"):
+        df[col] = df[col].str.strip().str.lower().isin(_TRUE_WORDS)
+
+    # created_utc may be epoch seconds (int/float-like) or ISO string; try both, unparseable → NaT
+    raw = df["created_utc"].str.strip()
+    dt_num = pd.to_datetime(pd.to_numeric(raw, errors="coerce"), unit="s", utc=True, errors="coerce")
+    dt_iso = pd.to_datetime(raw.where(dt_num.isna()), utc=True, errors="coerce", format="ISO8601")
+    # kept as integer days since the epoch (UTC; <NA> if unparseable): grouping on int64 codes is
+    # far cheaper than hashing datetime.date objects; dates are rebuilt only for the output rows
+    df["created_epoch_day"] = ((dt_num.fillna(dt_iso) - _EPOCH) // pd.Timedelta(days=1)).astype("Int64")
+
+    # enum columns → categoricals (int codes for counting/crosstabs). Off-enum values seen in the
+    # file are kept as extra categories so nothing turns into NaN; sorted so order stays lexical.
+    for col, vals in ENUM_CATEGORIES.items():
+        v = df[col].str.strip().str.lower()
+        df[col] = pd.Categorical(v, categories=sorted(set(vals).union(v.unique())))
 
     return df
 
@@ -85,6 +123,20 @@ def write_csv(path: Path, rows, header):
         for r in rows:
             w.writerow(r)
 
+def value_counts_long(df: pd.DataFrame, fields: list) -> pd.DataFrame:
+    """(field, value, count) for all fields in one melt + groupby; fields in given order, then count
+    descending, ties broken by value ascending."""
+    long = (
+        df[fields].apply(
+            lambda s: s if isinstance(s.dtype, pd.CategoricalDtype) else s.astype(str).str.strip().str.lower()
+        )
+        .melt(var_name="field", value_name="value")
+    )
+    counts = long.groupby(["field","value"], sort=False).size().reset_index(name="count")
+    counts["field"] = pd.Categorical(counts["field"], categories=fields, ordered=True)
+    counts["value"] = counts["value"].astype(str)
+    return counts.sort_values(["field","count","value"], ascending=[True, False, True], kind="stable")
+
 def summarize(df: pd.DataFrame, outdir: Path, input_path: Path):
     outdir.mkdir(parents=True, exist_ok=True)
 
@@ -94,6 +146,11 @@ def summarize(df: pd.DataFrame, outdir: Path, input_path: Path):
     n_er_all = int(df["er_or_hospital_mentioned"].sum())
     # Among injury-only
     df_inj = df[df["is_injury_event"] == True].copy()
+    # enum columns are already normalized categoricals; drop categories unused in this subset so the
+    # crosstabs (dropna=False) only list observed values. subreddit is free text: normalize it once.
+    for col in ENUM_CATEGORIES:
+        df_inj[col] = df_inj[col].cat.remove_unused_categories()
+    df_inj["subreddit"] = df_inj["subreddit"].astype(str).str.strip().str.lower()
     n_er_inj = int(df_inj["er_or_hospital_mentioned"].sum())
     p_er_inj = (n_er_inj / len(df_inj) * 100.0) if len(df_inj) else 0.0
 
@@ -117,49 +174,43 @@ def summarize(df: pd.DataFrame, outdir: Path, input_path: Path):
         "mechanism_of_injury","nature_of_injury","body_region",
         "age_group","er_or_hospital_mentioned","is_injury_event","subreddit"
     ]
-    rows = []
-    for col in fields_for_counts:
-        vc = df[col].astype(str).str.strip().str.lower().value_counts(dropna=False)
-        for val, cnt in vc.items():
-            rows.append([col, val, int(cnt)])
-    write_csv(outdir / "counts_by_field_all.csv", rows, header=["field","value","count"])
+    counts = value_counts_long(df, fields_for_counts)
+    write_csv(outdir / "counts_by_field_all.csv", counts.itertuples(index=False, name=None),
+              header=["field","value","count"])
 
     # Value counts INJURY ONLY (drop NA for created fields)
-    rows_inj = []
-    for col in ["mechanism_of_injury","nature_of_injury","body_region","age_group","er_or_hospital_mentioned","subreddit"]:
-        vc = df_inj[col].astype(str).str.strip().str.lower().value_counts(dropna=False)
-        for val, cnt in vc.items():
-            rows_inj.append([col, val, int(cnt)])
-    write_csv(outdir / "counts_by_field_injury_only.csv", rows_inj, header=["field","value","count"])
+    counts_inj = value_counts_long(
+        df_inj, ["mechanism_of_injury","nature_of_injury","body_region","age_group","er_or_hospital_mentioned","subreddit"]
+    )
+    write_csv(outdir / "counts_by_field_injury_only.csv", counts_inj.itertuples(index=False, name=None),
+              header=["field","value","count"])
 
     # Cross-tabs
     ct_mech_age = pd.crosstab(
-        df_inj["mechanism_of_injury"].str.lower(),
-        df_inj["age_group"].str.lower(),
+        df_inj["mechanism_of_injury"],
+        df_inj["age_group"],
         dropna=False
     ).sort_index()
     ct_mech_age.to_csv(outdir / "crosstab_mechanism_by_age.csv")
 
     ct_nat_body = pd.crosstab(
-        df_inj["nature_of_injury"].str.lower(),
-        df_inj["body_region"].str.lower(),
+        df_inj["nature_of_injury"],
+        df_inj["body_region"],
         dropna=False
     ).sort_index()
     ct_nat_body.to_csv(outdir / "crosstab_nature_by_body_region.csv")
 
     # Time series (injury events per day, UTC)
-    ts = (
-        df[df["is_injury_event"] & df["created_date_utc"].notna()]
-        .groupby("created_date_utc", as_index=False)
-        .size()
-        .rename(columns={"size":"injury_events"})
-        .sort_values("created_date_utc")
-    )
+    day_counts = df.loc[df["is_injury_event"], "created_epoch_day"].dropna().value_counts().sort_index()
+    ts = pd.DataFrame({
+        "created_date_utc": pd.to_datetime(day_counts.index.to_numpy("int64"), unit="D").date,
+        "injury_events": day_counts.to_numpy(),
+    })
     ts.to_csv(outdir / "timeseries_injury_events_daily.csv", index=False)
 
     # Top subreddits by injury posts
     top_subs = (
-        df_inj["subreddit"].str.lower().value_counts()
+        df_inj["subreddit"].value_counts()
         .rename_axis("subreddit").reset_index(name="injury_posts")
         .sort_values("injury_posts", ascending=False)
     )
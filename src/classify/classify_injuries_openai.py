@@ -1,21 +1,39 @@
 # classify_injuries_openai.py
 #!/usr/bin/env python3
 """
-One-click VS Code classifier for child-injury Reddit posts (gpt-5-nano, Chat Completions JSON mode)
+One-click VS Code classifier for child-injury Reddit posts (gpt-5-nano, Chat Completions with a strict JSON schema)
 with client-side guardrails to enforce enums and consistency.
 Now includes wall-clock timing (total, posts/sec, sec/post) and optional temperature control.
+Requests go out concurrently through the async client (CONCURRENCY at a time, sliding window).
 """
 
-import os, json, csv, gzip, re, time
+import os, json, csv, gzip, re, time, random, asyncio, argparse, hashlib, sqlite3
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, Any
-from tenacity import retry, stop_after_attempt, wait_exponential_jitter
-from openai import OpenAI, BadRequestError
+from typing import Dict, Any, Union
+import httpx
+from openai import (AsyncOpenAI, BadRequestError, DefaultAsyncHttpxClient, Timeout,
+                    RateLimitError, APIConnectionError, InternalServerError)
+
+try:
+    import orjson as _json  # optional, ~3x faster JSONL parse/serialize; stdlib fallback below
+except ImportError:
+    _json = None
 
 # ---------------- Config ----------------
 
 MODEL_NAME = "gpt-5-nano"   # change here to test other models (e.g., "gpt-4.1-mini")
 TEMPERATURE = None          # set e.g. 0.2 for models that support it; keep None for nano
+PROMPT_CACHE_KEY = "child_injury_v1"  # routes requests sharing the static prefix to the same prompt cache
+CONCURRENCY = 32            # requests in flight at once; lower if you hit 429s
+WINDOW = 2 * CONCURRENCY    # posts scheduled at once (in flight + waiting/backing off)
+REQUEST_TIMEOUT = 120.0     # seconds per request; a stalled call fails and is retried instead of holding a slot
+OUT_BUFFER = 1024 * 1024    # output file buffer (bytes); files are flushed only at checkpoints
+FLUSH_EVERY = 100           # checkpoint: flush both outputs after roughly this many posts
+RESUME = True               # rerun appends to existing outputs, skipping ids already labelled
+LABEL_CACHE = True          # reuse labels for identical post text from data/interim/label_cache.sqlite
+PROMPT_VERSION = 1          # bump when SYSTEM_PROMPT / schema / normalization change (invalidates the cache)
+EMIT_RATIONALE = False      # ask for rationale_short too (~40-80 extra output tokens per post); off = faster, cheaper
 
 SYSTEM_PROMPT = """You are a careful public-health coder.
 Task: Decide if a Reddit post describes a REAL child injury incident and classify it.
@@ -51,33 +69,48 @@ ENUMS = {
     }
 }
 
-def _norm_str(x):
-    return (x or "").strip().lower()
-
-def _norm_bool(x):
-    s = _norm_str(str(x))
-    return s in {"true","1","yes","y"}
+# Per-field lookups for injury posts: one dict.get both validates and canonicalizes
+# (miss → "unknown"); "not_applicable" is only valid when there is no injury.
+_ENUM_LOOKUP = {k: {v: ("unknown" if v == "not_applicable" else v) for v in vals} for k, vals in ENUMS.items()}
 
-def normalize_label(label: dict) -> dict:
-    label["is_injury_event"] = _norm_bool(label.get("is_injury_event"))
-    label["er_or_hospital_mentioned"] = _norm_bool(label.get("er_or_hospital_mentioned"))
+_ENUM_KEYS = ("mechanism_of_injury","nature_of_injury","body_region","age_group")
+_TRUE_WORDS = frozenset(("true","1","yes","y"))
+_NOT_INJURY = {**{k: "not_applicable" for k in _ENUM_KEYS}, "er_or_hospital_mentioned": False}
 
-    for k in ("mechanism_of_injury","nature_of_injury","body_region","age_group"):
-        v = _norm_str(label.get(k))
-        label[k] = v if v in ENUMS[k] else "unknown"
+# the model emits the same couple of dozen strings over and over
+@lru_cache(maxsize=64)
+def _norm_str(x):
+    return (x or "").strip().lower()
 
-    label["rationale_short"] = (label.get("rationale_short") or "")[:280]
+@lru_cache(maxsize=64)
+def _is_true_word(x: str) -> bool:
+    return x.strip().lower() in _TRUE_WORDS
 
-    if not label["is_injury_event"]:
-        label["mechanism_of_injury"] = "not_applicable"
-        label["nature_of_injury"]    = "not_applicable"
-        label["body_region"]         = "not_applicable"
-        label["age_group"]           = "not_applicable"
-        label["er_or_hospital_mentioned"] = False
+def _norm_bool(x):
+    if x is True or x is False:  # the strict schema returns real booleans
+        return x
+    return _is_true_word(str(x))
+
+# Hot path on large (re)classification runs: lookups are bound as default args (LOAD_FAST),
+# the four enum fields are unrolled, and they are only parsed when they are kept.
+def normalize_label(label: dict, _not_injury=_NOT_INJURY, _norm_str=_norm_str, _norm_bool=_norm_bool,
+                    _mech=_ENUM_LOOKUP["mechanism_of_injury"], _nature=_ENUM_LOOKUP["nature_of_injury"],
+                    _region=_ENUM_LOOKUP["body_region"], _age=_ENUM_LOOKUP["age_group"],
+                    _rationale=EMIT_RATIONALE) -> dict:
+    get = label.get
+    injury = _norm_bool(get("is_injury_event"))
+    label["is_injury_event"] = injury
+    if _rationale:
+        label["rationale_short"] = (get("rationale_short") or "")[:280]
+
+    if not injury:
+        label.update(_not_injury)
     else:
-        for k in ("mechanism_of_injury","nature_of_injury","body_region","age_group"):
-            if label[k] == "not_applicable":
-                label[k] = "unknown"
+        label["er_or_hospital_mentioned"] = _norm_bool(get("er_or_hospital_mentioned"))
+        label["mechanism_of_injury"] = _mech.get(_norm_str(get("mechanism_of_injury")), "unknown")
+        label["nature_of_injury"] = _nature.get(_norm_str(get("nature_of_injury")), "unknown")
+        label["body_region"] = _region.get(_norm_str(get("body_region")), "unknown")
+        label["age_group"] = _age.get(_norm_str(get("age_group")), "unknown")
 
     return label
 
@@ -89,6 +122,22 @@ def find_repo_root(start: Path) -> Path:
             return p
     return start.parents[2] if len(start.parents) >= 3 else start
 
+def make_http_client() -> httpx.AsyncClient:
+    """Shared keep-alive pool for all requests; HTTP/2 (one multiplexed connection) if h2 is installed."""
+    try:
+        import h2  # noqa: F401  (optional: pip install "httpx[http2]")
+        http2 = True
+    except ImportError:
+        http2 = False
+    # DefaultAsyncHttpxClient keeps the SDK's redirect settings; connections idle through a
+    # backoff sleep stay pooled (httpx's default keepalive_expiry is only 5 s)
+    return DefaultAsyncHttpxClient(
+        http2=http2,
+        timeout=Timeout(REQUEST_TIMEOUT, connect=10.0),
+        limits=httpx.Limits(max_connections=CONCURRENCY, max_keepalive_connections=CONCURRENCY,
+                            keepalive_expiry=60.0),
+    )
+
 def load_env(repo_root: Path):
     try:
         from dotenv import load_dotenv
@@ -101,14 +150,101 @@ def require_api_key():
         raise RuntimeError("OPENAI_API_KEY not set. Add to .env at repo root.")
 
 def newest_raw_file(raw_dir: Path) -> Path:
-    candidates = list(raw_dir.glob("*.jsonl")) + list(raw_dir.glob("*.jsonl.gz"))
+    # DirEntry caches its stat, so picking the newest costs no extra syscalls
+    with os.scandir(raw_dir) as it:
+        candidates = [e for e in it if e.name.endswith((".jsonl", ".jsonl.gz")) and e.is_file()]
     if not candidates:
         raise FileNotFoundError(f"No .jsonl/.jsonl.gz files in {raw_dir}")
-    candidates.sort(key=lambda p: p.stat().st_mtime, reverse=True)
-    return candidates[0]
+    newest = max(candidates, key=lambda e: e.stat().st_mtime)
+    return Path(newest.path)
 
 def open_maybe_gzip(path: Path):
-    return gzip.open(path, "rt", encoding="utf-8") if path.suffix == ".gz" else open(path, "r", encoding="utf-8")
+    # bytes mode: both orjson and json.loads accept UTF-8 bytes, so skip the text decode layer
+    return gzip.open(path, "rb") if path.suffix == ".gz" else open(path, "rb")
+
+def loads_line(line: Union[bytes, str]):
+    return _json.loads(line) if _json is not None else json.loads(line)
+
+def dumps_line(obj) -> bytes:
+    """One JSONL record as UTF-8 bytes (newline included)."""
+    if _json is not None:
+        return _json.dumps(obj, option=_json.OPT_APPEND_NEWLINE)
+    return (json.dumps(obj, ensure_ascii=False) + "\n").encode("utf-8")
+
+def count_lines(path: Path, chunk_size: int = 1 << 20) -> int:
+    """Cheap first pass for the [idx/total] progress log: newlines counted in 1 MiB chunks, nothing parsed."""
+    n, last = 0, b"\n"
+    with open_maybe_gzip(path) as f:
+        try:
+            while chunk := f.read(chunk_size):
+                n += chunk.count(b"\n")
+                last = chunk[-1:]
+        except EOFError:  # torn gzip tail; iter_posts warns about it
+            pass
+    return n + (last != b"\n")
+
+def iter_posts(path: Path):
+    """Yield posts one at a time (malformed lines skipped), so the input is never held in memory."""
+    with open_maybe_gzip(path) as f:
+        try:
+            for line in f:
+                try:
+                    yield loads_line(line)
+                except ValueError:  # json / orjson JSONDecodeError
+                    continue
+        except EOFError:  # crawl killed mid-write; the crawler cuts the tail off on its next run
+            print(f"[warn] {path.name} ends in a truncated gzip member; stopped reading there")
+
+def done_ids(out_csv: Path) -> set:
+    """ids already written to a previous run's labels CSV (empty if there is none)."""
+    if not out_csv.exists():
+        return set()
+    with open(out_csv, newline="", encoding="utf-8") as fp:
+        r = csv.reader(fp)
+        if next(r, [None])[:1] != ["id"]:
+            return set()
+        return {row[0] for row in r if row}
+
+def content_key(rec: dict) -> str:
+    """sha256 of the post text; same recipe as crawler.sanitise_row, whose content_hash is reused."""
+    h = rec.get("content_hash")
+    if h:
+        return h
+    body = ((rec.get("title") or "") + "\n" + (rec.get("selftext") or "")).strip()
+    return hashlib.sha256(body.encode("utf-8")).hexdigest()
+
+def open_label_cache(path: Path) -> sqlite3.Connection:
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS labels ("
+        " hash TEXT NOT NULL, model TEXT NOT NULL, prompt_version INTEGER NOT NULL, label_json TEXT NOT NULL,"
+        " PRIMARY KEY (hash, model, prompt_version))"
+    )
+    return conn
+
+def cache_get(conn, key: str):
+    if conn is None:
+        return None
+    row = conn.execute(
+        "SELECT label_json FROM labels WHERE hash = ? AND model = ? AND prompt_version = ?",
+        (key, MODEL_NAME, PROMPT_VERSION),
+    ).fetchone()
+    if row is None:
+        return None
+    label = loads_line(row[0])
+    # labels cached with EMIT_RATIONALE off have no rationale to hand back
+    return None if EMIT_RATIONALE and "rationale_short" not in label else label
+
+def cache_put(conn, key: str, label: dict):
+    # parser errors are not cached, so the next run asks the model again
+    if conn is None or str(label.get("rationale_short", "")).startswith("parser_error:"):
+        return
+    conn.execute(
+        "INSERT OR REPLACE INTO labels (hash, model, prompt_version, label_json) VALUES (?, ?, ?, ?)",
+        (key, MODEL_NAME, PROMPT_VERSION, dumps_line(label).decode("utf-8")),
+    )
 
 def stem_for_output(path: Path) -> str:
     name = path.name
@@ -116,64 +252,119 @@ def stem_for_output(path: Path) -> str:
     if name.endswith(".jsonl"):    return name[:-6]
     return path.stem
 
+_JSON_TOKENS = re.compile(r'[{}"\\]')  # the only characters the brace scan has to look at
+
 def _extract_json(text: str) -> str:
-    m = re.search(r"\{.*\}", text, flags=re.DOTALL)
-    if not m:
+    """First balanced {...} object in text (string/escape aware), for JSON wrapped in prose."""
+    i = text.find("{")
+    if i < 0:
         raise ValueError("No JSON object found in model output")
-    return m.group(0)
-
-# ---------------- Model call (Chat Completions JSON mode) ----------------
-
-@retry(stop=stop_after_attempt(5), wait=wait_exponential_jitter(initial=1, max=12))
-def classify_post(client: OpenAI, title: str, body: str) -> Dict[str, Any]:
-    body = (body or "").strip()
-    if len(body) > 4000:
-        body = body[:4000] + " ...[truncated]"
-
-    user_prompt = f"""Classify this Reddit post.
-
-TITLE:
-{title or ''}
-
-BODY:
-{body}
+    depth, in_str, skip = 0, False, -1
+    # finditer jumps between structural characters in C instead of stepping through every char
+    for m in _JSON_TOKENS.finditer(text, i):
+        p = m.start()
+        if p == skip:  # character escaped by the preceding backslash
+            continue
+        c = text[p]
+        if c == "\\":
+            skip = p + 1
+        elif c == '"':
+            in_str = not in_str
+        elif not in_str:
+            depth += 1 if c == "{" else -1
+            if depth == 0:
+                return text[i:p + 1]
+    raise ValueError("Unbalanced JSON object in model output")
+
+# ---------------- Model call (Chat Completions, strict JSON schema) ----------------
+
+# Label schema enforced server-side (Structured Outputs), so the enum listing no longer has to
+# ride along in every prompt. Built once from ENUMS.
+LABEL_SCHEMA = {
+    "name": "injury_label",
+    "strict": True,
+    "schema": {
+        "type": "object",
+        "properties": {
+            "is_injury_event":          {"type": "boolean"},
+            "mechanism_of_injury":      {"type": "string", "enum": sorted(ENUMS["mechanism_of_injury"])},
+            "nature_of_injury":         {"type": "string", "enum": sorted(ENUMS["nature_of_injury"])},
+            "body_region":              {"type": "string", "enum": sorted(ENUMS["body_region"])},
+            "er_or_hospital_mentioned": {"type": "boolean"},
+            "age_group":                {"type": "string", "enum": sorted(ENUMS["age_group"])},
+        },
+        "required": [
+            "is_injury_event","mechanism_of_injury","nature_of_injury","body_region",
+            "er_or_hospital_mentioned","age_group"
+        ],
+        "additionalProperties": False,
+    },
+}
+if EMIT_RATIONALE:
+    LABEL_SCHEMA["schema"]["properties"]["rationale_short"] = {
+        "type": "string", "description": "<=280 chars; paraphrase only"
+    }
+    LABEL_SCHEMA["schema"]["required"].append("rationale_short")
+_RESPONSE_FORMAT = {"type": "json_schema", "json_schema": LABEL_SCHEMA}
+
+# Static prompt pieces, built once; classify_post only splices in the title and body.
+# Everything invariant sits in the system message (first, byte-stable) so the provider's prefix
+# cache can reuse it; the user message carries only the post. _USER_TAIL (the spelled-out schema)
+# is only needed by the fallback request without response_format.
+_SYSTEM_MESSAGE = {"role": "system", "content": SYSTEM_PROMPT}
+_USER_HEAD = "Classify this Reddit post.\n\nTITLE:\n"
+_USER_MID = "\n\nBODY:\n"
+_USER_TAIL = """
 
 Return a single JSON object with exactly these keys and allowed values:
-{{
+{
   "is_injury_event": boolean,
   "mechanism_of_injury": one of ["road_transport","fall","drowning","burn","scald","poisoning","choking_or_suffocation","foreign_body_ingestion","cut_pierce","struck_by_object","animal_related","other","unknown","not_applicable"],
   "nature_of_injury": one of ["fracture","laceration","contusion","burn","poisoning","asphyxiation","internal_injury","dental_injury","multiple","other","unknown","not_applicable"],
   "body_region": one of ["head_face","neck","torso","arm_hand","leg_foot","multiple","unknown","not_applicable"],
   "er_or_hospital_mentioned": boolean,
-  "age_group": one of ["newborn","infant","toddler","preschool","child_unspecified","unknown","not_applicable"],
-  "rationale_short": string (<=280 chars; paraphrase only)
-}}
+  "age_group": one of ["newborn","infant","toddler","preschool","child_unspecified","unknown","not_applicable"]""" + (""",
+  "rationale_short": string (<=280 chars; paraphrase only)""" if EMIT_RATIONALE else "") + """
+}
 No prose. No code fences. JSON only.
 """
-
-    messages = [
-        {"role": "system", "content": SYSTEM_PROMPT},
-        {"role": "user",   "content": user_prompt},
-    ]
-
-    # Build kwargs with optional temperature; retry without if unsupported
-    kwargs = dict(model=MODEL_NAME, messages=messages)
+_SYSTEM_MESSAGE_NO_SCHEMA = {"role": "system", "content": SYSTEM_PROMPT + _USER_TAIL}
+
+BODY_MAX_BYTES = 4000  # body budget in UTF-8 bytes (a closer proxy for tokens than characters)
+
+def build_user_prompt(title: str, body: str) -> str:
+    # empty selftext (link/image posts) is common: skip the strip call outright. For the rest,
+    # str.strip() returns body itself when there is nothing to trim, so short posts are not copied.
+    # A body of <= BODY_MAX_BYTES/4 chars cannot exceed the budget, so only longer ones are encoded;
+    # the cut is decoded with "ignore" so a split multi-byte character is dropped, not mangled.
+    # Lone surrogates (from \ud800-style JSON escapes) are encoded with "replace" rather than raising.
+    body = body.strip() if body else ""
+    if len(body) > BODY_MAX_BYTES // 4:
+        bb = body.encode("utf-8", "replace")
+        if len(bb) > BODY_MAX_BYTES:
+            body = bb[:BODY_MAX_BYTES].decode("utf-8", "ignore") + " ...[truncated]"
+    return _USER_HEAD + (title or "") + _USER_MID + body
+
+def build_request(user_prompt: str) -> Dict[str, Any]:
+    """Chat Completions kwargs for one post (also the "body" of a Batch API request line)."""
+    kwargs = dict(
+        model=MODEL_NAME,
+        messages=[_SYSTEM_MESSAGE, {"role": "user", "content": user_prompt + "\n"}],
+        response_format=_RESPONSE_FORMAT,
+        prompt_cache_key=PROMPT_CACHE_KEY,
+    )
     if TEMPERATURE is not None:
         kwargs["temperature"] = float(TEMPERATURE)
+    return kwargs
 
+def parse_label(text: str) -> Dict[str, Any]:
     try:
-        kwargs["response_format"] = {"type": "json_object"}
-        resp = client.chat.completions.create(**kwargs)
-    except (TypeError, BadRequestError) as e:
-        emsg = str(e).lower()
-        if "temperature" in emsg and "unsupported" in emsg:
-            kwargs.pop("temperature", None)
-        kwargs.pop("response_format", None)
-        resp = client.chat.completions.create(**kwargs)
-
-    text = resp.choices[0].message.content
-    try:
-        label = json.loads(_extract_json(text))
+        try:
+            label = loads_line(text)  # the strict schema makes bare JSON the normal case
+        except ValueError:
+            label = loads_line(_extract_json(text))
+        if not isinstance(label, dict):
+            raise ValueError("model output is not a JSON object")
     except Exception as e:
         label = {
             "is_injury_event": False,
@@ -184,12 +375,178 @@ No prose. No code fences. JSON only.
             "age_group": "unknown",
             "rationale_short": f"parser_error: {e.__class__.__name__}"
         }
-
     return normalize_label(label)
 
+MAX_ATTEMPTS = 5
+RETRY_BACKOFF = (1, 12)  # seconds: first wait, cap (doubles per attempt, plus up to 1 s jitter)
+# transient only (429, 5xx, connection drops/timeouts); 400/401/404 etc. fail on the first try
+_RETRYABLE = (RateLimitError, APIConnectionError, InternalServerError)
+
+def _retry_delay(attempt: int) -> float:
+    return min(RETRY_BACKOFF[0] * 2 ** attempt + random.random(), RETRY_BACKOFF[1])
+
+async def with_retries(call, *args, **kwargs):
+    """await call(*args, **kwargs) under the same transient-error policy as classify_post."""
+    for attempt in range(MAX_ATTEMPTS):
+        try:
+            return await call(*args, **kwargs)
+        except _RETRYABLE:
+            if attempt == MAX_ATTEMPTS - 1:
+                raise
+            await asyncio.sleep(_retry_delay(attempt))
+
+async def classify_post(client: AsyncOpenAI, sem: asyncio.Semaphore, title: str, body: str) -> Dict[str, Any]:
+    kwargs = build_request(build_user_prompt(title, body))
+
+    for attempt in range(MAX_ATTEMPTS):
+        try:
+            # the semaphore is held only for the request itself, not during the backoff sleeps
+            async with sem:
+                try:
+                    resp = await client.chat.completions.create(**kwargs)
+                except (TypeError, BadRequestError) as e:
+                    # retry without temperature if unsupported
+                    emsg = str(e).lower()
+                    if "temperature" in emsg and "unsupported" in emsg:
+                        kwargs.pop("temperature", None)
+                    if isinstance(e, TypeError):  # older SDK without these parameters
+                        kwargs.pop("prompt_cache_key", None)
+                    # no schema support: fall back to plain completion with the schema spelled out in
+                    # the prompt (kwargs keep the fallback for later attempts)
+                    kwargs.pop("response_format", None)
+                    kwargs["messages"] = [_SYSTEM_MESSAGE_NO_SCHEMA, kwargs["messages"][1]]
+                    resp = await client.chat.completions.create(**kwargs)
+            return parse_label(resp.choices[0].message.content)
+        except _RETRYABLE:
+            if attempt == MAX_ATTEMPTS - 1:
+                raise
+            await asyncio.sleep(_retry_delay(attempt))
+
+# ---------------- Batch API (--batch) ----------------
+
+BATCH_MAX_REQUESTS = 50_000           # OpenAI per-batch limits: 50k requests and 200 MB per input file
+BATCH_MAX_BYTES = 190 * 1024 * 1024
+BATCH_POLL = (30, 600)                # seconds between status checks: initial, cap (doubles each time)
+_BATCH_DONE = {"completed", "failed", "expired", "cancelled"}
+
+def batch_state_path(work_dir: Path, base: str) -> Path:
+    """Submitted batch ids, so a crashed or interrupted run resumes them instead of paying again."""
+    return work_dir / f"{base}_batch_state.json"
+
+def save_batch_state(path: Path, batches):
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps({"model": MODEL_NAME, "batch_ids": [b.id for b in batches]}), encoding="utf-8")
+    os.replace(tmp, path)
+
+def load_batch_state(path: Path):
+    if not path.exists():
+        return None
+    state = json.loads(path.read_text(encoding="utf-8"))
+    if state.get("model") != MODEL_NAME:
+        print(f"[warn] {path.name} is for model {state.get('model')!r}, not {MODEL_NAME!r}; ignored")
+        return None
+    return state.get("batch_ids") or None
+
+async def submit_batches(client: AsyncOpenAI, posts, work_dir: Path, base: str, state_path: Path):
+    # 1) request files, split at the per-batch limits; custom_id = post id (must be unique)
+    parts, seen = [], set()
+    fp, n_req, n_bytes = None, 0, 0
+    for rec in posts:
+        pid = rec.get("id")
+        if not pid or pid in seen:
+            continue
+        seen.add(pid)
+        line = dumps_line({
+            "custom_id": pid, "method": "POST", "url": "/v1/chat/completions",
+            "body": build_request(build_user_prompt(rec.get("title") or "", rec.get("selftext") or "")),
+        })
+        if fp is None or n_req >= BATCH_MAX_REQUESTS or n_bytes + len(line) > BATCH_MAX_BYTES:
+            if fp is not None:
+                fp.close()
+            parts.append(work_dir / f"{base}_batch_input_{len(parts)}.jsonl")
+            fp = open(parts[-1], "wb", buffering=OUT_BUFFER)
+            n_req = n_bytes = 0
+        fp.write(line)
+        n_req += 1
+        n_bytes += len(line)
+    if fp is not None:
+        fp.close()
+
+    # 2) upload + submit; the state file is rewritten after every submission
+    batches = []
+    for path in parts:
+        # a path (not an open file) so a retried upload re-reads it from the start
+        up = await with_retries(client.files.create, file=path, purpose="batch")
+        # not retried: if the response is lost, a retry could submit (and bill) the batch twice
+        b = await client.batches.create(input_file_id=up.id, endpoint="/v1/chat/completions",
+                                        completion_window="24h")
+        print(f"Submitted batch {b.id} ({path.name})")
+        batches.append(b)
+        save_batch_state(state_path, batches)
+    return batches
+
+async def run_batch(client: AsyncOpenAI, posts, work_dir: Path, base: str) -> Dict[str, Any]:
+    """
+    Classify posts through the Batch API (half price, no per-request round trips, up to 24h).
+    Returns {post_id: label}, or {post_id: Exception} for requests the batch reported as failed;
+    posts missing from the result are simply absent.
+    If batches from an earlier run are still recorded in the state file, those are polled and
+    downloaded instead of submitting new ones (posts outside them wait for the next run).
+    """
+    state_path = batch_state_path(work_dir, base)
+    batch_ids = load_batch_state(state_path)
+    if batch_ids:
+        print(f"Resuming {len(batch_ids)} submitted batch(es) from {state_path.name}")
+        batches = [await with_retries(client.batches.retrieve, bid) for bid in batch_ids]
+    else:
+        batches = await submit_batches(client, posts, work_dir, base, state_path)
+        if not batches:
+            return {}
+
+    # 3) poll with exponential backoff until every batch reaches a terminal state
+    delay = BATCH_POLL[0]
+    while True:
+        batches = [await with_retries(client.batches.retrieve, b.id) for b in batches]
+        if all(b.status in _BATCH_DONE for b in batches):
+            break
+        done_n = sum(b.request_counts.completed for b in batches if b.request_counts)
+        print(f"[batch] {', '.join(b.status for b in batches)} | completed={done_n}; next check in {delay}s")
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, BATCH_POLL[1])
+
+    # 4) download results (kept next to the inputs) and stream-parse them
+    results: Dict[str, Any] = {}
+    for i, b in enumerate(batches):
+        if b.status != "completed":
+            print(f"[warn] batch {b.id} ended as {b.status}; its posts are left for the next run")
+        if not b.output_file_id:
+            continue
+        out_path = work_dir / f"{base}_batch_output_{i}.jsonl"
+        content = await with_retries(client.files.content, b.output_file_id)
+        content.write_to_file(out_path)
+        with open(out_path, "rb") as f:
+            for line in f:
+                try:
+                    item = loads_line(line)
+                    resp = item.get("response") or {}
+                    if resp.get("status_code") != 200:
+                        results[item["custom_id"]] = RuntimeError(f"batch request failed: {item.get('error') or resp}")
+                        continue
+                    results[item["custom_id"]] = parse_label(resp["body"]["choices"][0]["message"]["content"])
+                except (ValueError, KeyError, IndexError, TypeError) as e:
+                    print(f"[warn] unreadable batch output line skipped: {e!r}")
+    return results
+
 # ---------------- Main ----------------
 
-def main():
+def parse_args():
+    ap = argparse.ArgumentParser(description="Classify the newest raw JSONL in data/raw/ with OpenAI.")
+    ap.add_argument("--batch", action="store_true",
+                    help="Use the OpenAI Batch API (half price, results within 24h) instead of live requests")
+    return ap.parse_args()
+
+async def main():
+    args = parse_args()
     script_path = Path(__file__).resolve()
     repo_root = find_repo_root(script_path)
     load_env(repo_root)
@@ -198,7 +555,8 @@ def main():
     raw_dir = repo_root / "data" / "raw"
     inp_path = newest_raw_file(raw_dir)
     print(f"Using input: {inp_path}")
-    print(f"Model: {MODEL_NAME} | temperature: {TEMPERATURE if TEMPERATURE is not None else 'default'}")
+    print(f"Model: {MODEL_NAME} | temperature: {TEMPERATURE if TEMPERATURE is not None else 'default'} | "
+          f"{'batch API' if args.batch else f'concurrency: {CONCURRENCY}'}")
 
     out_dir = repo_root / "data" / "interim"
     out_dir.mkdir(parents=True, exist_ok=True)
@@ -207,36 +565,46 @@ def main():
     out_jsonl = out_dir / f"{base}_labels.jsonl"
     out_metrics = out_dir / f"{base}_timing.json"  # timing summary
 
-    client = OpenAI()  # reads OPENAI_API_KEY
+    # reads OPENAI_API_KEY; SDK retries are off so MAX_ATTEMPTS/with_retries is the only retry policy
+    client = AsyncOpenAI(http_client=make_http_client(), max_retries=0)
+    sem = asyncio.Semaphore(CONCURRENCY)
 
-    # Load posts
-    posts = []
-    with open_maybe_gzip(inp_path) as f:
-        for line in f:
-            try:
-                posts.append(json.loads(line))
-            except json.JSONDecodeError:
-                continue
+    # Posts are streamed from disk inside the write loop; only count them up front
+    total = count_lines(inp_path)
+    print(f"Found {total} posts")
 
-    total = len(posts)
-    print(f"Loaded {total} posts")
+    # Resume: the checkpoint flushes leave whole rows on disk, so an interrupted run (or posts
+    # skipped after failed retries) picks up where it stopped instead of starting over
+    done = done_ids(out_csv) if RESUME else set()
+    if done:
+        total = max(total - len(done), 0)
+        print(f"Resuming: {len(done)} posts already in {out_csv.name}, {total} to go")
 
     csv_fields = [
         "id","subreddit","created_utc","permalink","title",
         "is_injury_event","mechanism_of_injury","nature_of_injury","body_region",
-        "er_or_hospital_mentioned","age_group","rationale_short"
-    ]
+        "er_or_hospital_mentioned","age_group"
+    ] + (["rationale_short"] if EMIT_RATIONALE else [])
 
     ALLOWED_LABEL_KEYS = {
         "is_injury_event","mechanism_of_injury","nature_of_injury","body_region",
-        "er_or_hospital_mentioned","age_group","rationale_short"
-    }
+        "er_or_hospital_mentioned","age_group"
+    } | ({"rationale_short"} if EMIT_RATIONALE else set())
+
+    # appending rows of a different shape would corrupt the CSV
+    if done:
+        with open(out_csv, newline="", encoding="utf-8") as fp:
+            header = next(csv.reader(fp))
+        if header != csv_fields:
+            raise SystemExit(f"{out_csv.name} has columns {header}, expected {csv_fields} "
+                             f"(EMIT_RATIONALE changed?); delete it or set RESUME = False")
 
     def filter_label_keys(label: dict) -> dict:
         out = {k: label.get(k, "") for k in ALLOWED_LABEL_KEYS}
         if out["is_injury_event"] in ("", None): out["is_injury_event"] = False
         if out["er_or_hospital_mentioned"] in ("", None): out["er_or_hospital_mentioned"] = False
-        out["rationale_short"] = (out.get("rationale_short") or "")[:280]
+        if EMIT_RATIONALE:
+            out["rationale_short"] = (out.get("rationale_short") or "")[:280]
         return out
 
     kept = rejected = 0
@@ -245,33 +613,61 @@ def main():
     # ---- start timing just before classification loop
     t0 = time.perf_counter()
 
-    with open(out_csv, "w", newline="", encoding="utf-8") as csv_fp, \
-         open(out_jsonl, "w", encoding="utf-8") as jsonl_fp:
-
-        writer = csv.DictWriter(csv_fp, fieldnames=csv_fields, extrasaction="ignore")
-        writer.writeheader()
+    def pending_posts():
+        return (rec for rec in iter_posts(inp_path) if rec.get("id") not in done)
+
+    # Label cache: identical post text (same model + prompt version) is never sent twice
+    cache = open_label_cache(out_dir / "label_cache.sqlite") if LABEL_CACHE else None
+    cache_hits = 0
+
+    # Batch mode: submit everything not cached up front and wait for the results before opening the outputs
+    batch_results = None
+    if args.batch:
+        batch_results = await run_batch(
+            client, (rec for rec in pending_posts() if cache_get(cache, content_key(rec)) is None), out_dir, base
+        )
+
+    with open(out_csv, "a" if done else "w", newline="", encoding="utf-8", buffering=OUT_BUFFER) as csv_fp, \
+         open(out_jsonl, "ab" if done else "wb", buffering=OUT_BUFFER) as jsonl_fp:
+
+        writer = csv.writer(csv_fp)
+        if not done:
+            writer.writerow(csv_fields)
+        label_fields = csv_fields[5:]  # label columns follow the five post columns
+        rows_buffer, jsonl_buffer = [], []
+        idx = flushed_at = written = 0
+
+        def emit(rec, label, fresh=True):
+            """Record one finished post (label dict, or the Exception that made it fail)."""
+            nonlocal idx, processed, kept, rejected
+            idx += 1
+            if isinstance(label, Exception):
+                print(f"[warn] classification failed for post {rec.get('id')}, skipped: {label!r}")
+                return
+            if fresh:
+                cache_put(cache, content_key(rec), label)
 
-        for idx, rec in enumerate(posts, 1):
             title = rec.get("title") or ""
-            body  = rec.get("selftext") or ""
-
-            label = classify_post(client, title, body)
             clean_label = filter_label_keys(label)
 
-            extra = sorted(set(label.keys()) - ALLOWED_LABEL_KEYS)
+            # rationale_short always carries the parser_error marker, even with EMIT_RATIONALE off
+            rationale = str(label.get("rationale_short", ""))
+            if not EMIT_RATIONALE and rationale.startswith("parser_error:"):
+                print(f"[warn] unparseable model output for post {rec.get('id')}: {rationale}")
+            extra = sorted(set(label.keys()) - ALLOWED_LABEL_KEYS - {"rationale_short"})
             if extra:
-                print(f"[warn] extra label keys ignored at idx {idx}: {extra}")
+                print(f"[warn] extra label keys ignored for post {rec.get('id')}: {extra}")
 
-            writer.writerow({
-                "id": rec.get("id"),
-                "subreddit": rec.get("subreddit"),
-                "created_utc": rec.get("created_utc"),
-                "permalink": rec.get("permalink"),
-                "title": title,
-                **clean_label
-            })
+            rows_buffer.append(
+                (rec.get("id"), rec.get("subreddit"), rec.get("created_utc"), rec.get("permalink"), title)
+                + tuple(clean_label[k] for k in label_fields)
+            )
 
-            jsonl_fp.write(json.dumps({**rec, "**labels": clean_label}, ensure_ascii=False) + "\n")
+            # labels plus join keys only; title/selftext are already in the raw file (join on id)
+            jsonl_buffer.append(dumps_line({
+                "id": rec.get("id"), "subreddit": rec.get("subreddit"), "created_utc": rec.get("created_utc"),
+                "permalink": rec.get("permalink"), "labels": clean_label,
+            }))
 
             processed += 1
             if clean_label.get("is_injury_event"):
@@ -282,6 +678,89 @@ def main():
             if idx % 25 == 0 or idx == total:
                 print(f"[{idx}/{total}] kept={kept} rejected={rejected}")
 
+        def checkpoint():
+            nonlocal flushed_at, written
+            # one writerows / writelines per wake-up instead of a write per post; both outputs
+            # receive the same posts at the same point, so they stay in step
+            writer.writerows(rows_buffer)
+            written += len(rows_buffer)
+            jsonl_fp.writelines(jsonl_buffer)
+            rows_buffer.clear()
+            jsonl_buffer.clear()
+            if idx - flushed_at >= FLUSH_EVERY:
+                csv_fp.flush()
+                jsonl_fp.flush()
+                if cache is not None:
+                    cache.commit()
+                flushed_at = idx
+
+        def from_cache(rec) -> bool:
+            nonlocal cache_hits
+            label = cache_get(cache, content_key(rec))
+            if label is None:
+                return False
+            cache_hits += 1
+            emit(rec, label, fresh=False)
+            if len(rows_buffer) >= FLUSH_EVERY:
+                checkpoint()
+            return True
+
+        if batch_results is not None:
+            # second pass over the input writes rows in input order from the batch results
+            for rec in pending_posts():
+                if from_cache(rec):
+                    continue
+                label = batch_results.get(rec.get("id"))
+                emit(rec, label if label is not None else RuntimeError("no result in batch output"))
+                if len(rows_buffer) >= FLUSH_EVERY:
+                    checkpoint()
+            checkpoint()
+        else:
+            async def run(rec):
+                # never raises (except cancellation), so one bad post doesn't take down the window
+                try:
+                    return rec, await classify_post(client, sem, rec.get("title") or "", rec.get("selftext") or "")
+                except Exception as e:
+                    return rec, e
+
+            # Sliding window: keep WINDOW tasks alive and top it up as each finishes, so a slow
+            # request never stalls the others (as a gather-per-batch did). The semaphore still caps
+            # requests actually in flight; tasks beyond it are queued or sleeping in retry backoff.
+            # Rows are written here, by this single consumer, in completion order.
+            posts = pending_posts()
+            pending = set()
+            exhausted = False
+            while True:
+                while not exhausted and len(pending) < WINDOW:
+                    rec = next(posts, None)
+                    if rec is None:
+                        exhausted = True
+                    elif not from_cache(rec):
+                        pending.add(asyncio.create_task(run(rec)))
+                if not pending:
+                    break
+                finished, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in finished:
+                    emit(*task.result())
+                checkpoint()
+            checkpoint()  # cache hits emitted after the last wait (or a fully cached run)
+
+        # every emitted row must have reached the outputs by now
+        if written != processed:
+            print(f"[warn] {processed - written} labelled posts were not written to {out_csv.name}")
+
+        # malformed lines are counted in total but skipped, so close out the log here
+        if idx % 25 and idx != total:
+            print(f"[{idx}/{total}] kept={kept} rejected={rejected}")
+
+    if cache is not None:
+        cache.commit()
+        cache.close()
+
+    # every batch result is on disk now; the next --batch run submits afresh
+    if args.batch:
+        batch_state_path(out_dir, base).unlink(missing_ok=True)
+
     # ---- stop timing after loop
     t1 = time.perf_counter()
     elapsed_sec = t1 - t0
@@ -290,6 +769,7 @@ def main():
 
     print("\nTiming summary")
     print(f"  processed posts : {processed}")
+    print(f"  label cache hits: {cache_hits}")
     print(f"  total time      : {elapsed_sec:.2f} s")
     print(f"  posts/sec       : {posts_per_sec:.3f}")
     print(f"  sec/post        : {sec_per_post:.3f}")
@@ -303,6 +783,7 @@ def main():
                 "processed": processed,
                 "kept": kept,
                 "rejected": rejected,
+                "cache_hits": cache_hits,
                 "elapsed_seconds": elapsed_sec,
                 "posts_per_second": posts_per_sec,
                 "seconds_per_post": sec_per_post,
@@ -313,7 +794,8 @@ def main():
     except Exception as e:
         print(f"[warn] could not write timing metrics: {e}")
 
+    await client.close()
     print(f"\nDone.\nCSV: {out_csv}\nJSONL: {out_jsonl}")
 
 if __name__ == "__main__":
-    main()
+    asyncio.run(main())
@@ -1,21 +1,37 @@
-import praw
+import asyncpraw
+import asyncio
 import os
 import itertools
+import random
 import datetime
-import time
-import json, gzip, re, hashlib, tempfile, shutil
+import json, gzip, re, hashlib, sqlite3, zlib
 
 from pathlib import Path
+from aiolimiter import AsyncLimiter
+from asyncprawcore.exceptions import TooManyRequests
 from dotenv import load_dotenv
 
+try:
+    import orjson  # optional, emits UTF-8 bytes directly; stdlib fallback below
+except ImportError:
+    orjson = None
+
 
 load_dotenv()
 
-reddit = praw.Reddit(
-    client_id=os.getenv("REDDIT_CLIENT_ID"),
-    client_secret=os.getenv("REDDIT_CLIENT_SECRET"),
-    user_agent=os.getenv("REDDIT_USER_AGENT")
-)
+def make_reddit():
+    # asyncpraw clients must be created inside the running event loop
+    return asyncpraw.Reddit(
+        client_id=os.getenv("REDDIT_CLIENT_ID"),
+        client_secret=os.getenv("REDDIT_CLIENT_SECRET"),
+        user_agent=os.getenv("REDDIT_USER_AGENT")
+    )
+
+# Searches in flight at once, and the aggregate request budget shared by all of them
+# (Reddit allows ~60 requests/min per OAuth client; keep a little headroom)
+CONCURRENCY = 5
+RATE_LIMIT = (55, 60)  # (max requests, per seconds)
+MAX_429_RETRIES = 5    # exponential backoff (capped at 60 s) only when Reddit still says 429
 
 
 SUBS = "Parenting+Mommit+Daddit+NewParents+ChildSafety+BabyBumps+Nanny+Daycare+AskParents+BeyondTheBump"
@@ -30,54 +46,120 @@ AGES = ["baby", "infant", "newborn", "toddler", "1yo", "2 yo", "3 yo", "18 month
 
 EXCLUDES = ["lawyer", "insurance", "workout", "sports", "MLB", "NFL"]
 
-def build_query(event, age):
+# Terms are OR-ed in chunks so the grid costs (events/EVENT_CHUNK) x (ages/AGE_CHUNK)
+# searches instead of one per (event, age) pair; Reddit caps queries at ~512 chars
+EVENT_CHUNK = 6
+AGE_CHUNK = 4
+MAX_QUERY_LEN = 512
+# Result budget per (event, age) pair, as in the one-query-per-pair crawl; a chunked query pages
+# deep enough to give each of its pairs that share (6 x 4 pairs -> 240 results, 3 pages)
+PER_PAIR_LIMIT = 10
+MAX_LISTING = 1000  # Reddit search listings end at ~1000 results
+LISTING_PAGE = 100  # items per listing request; each page takes its own RATE_LIMIT token
+
+def _chunks(seq, n):
+    return [seq[i:i + n] for i in range(0, len(seq), n)]
+
+def build_query(events, ages):
     # Use title: for high-precision variants when useful
-    core = f'("{event}" AND {age})'
+    core = "(" + " OR ".join(f'"{e}"' for e in events) + ") AND (" + " OR ".join(f'"{a}"' for a in ages) + ")"
     filters = 'self:yes nsfw:no'
     negatives = " ".join(f'-{w}' for w in EXCLUDES)
-    return f'{core} {filters} {negatives}'
+    q = f'{core} {filters} {negatives}'
+    if len(q) > MAX_QUERY_LEN:
+        raise ValueError(f"Query is {len(q)} chars (> {MAX_QUERY_LEN}); lower EVENT_CHUNK/AGE_CHUNK")
+    return q
+
+# A batched query no longer says which term hit, so recover it from the text
+_TERM_RES = {t: re.compile(rf'(?<!\w){re.escape(t)}(?!\w)', re.I) for t in EVENTS + AGES}
 
-def search_terms(subs, events, ages, limit_per_query=10, cutoff_date="2025-11-01"):
+def first_match(text, terms):
+    for t in terms:
+        rx = _TERM_RES.get(t) or re.compile(rf'(?<!\w){re.escape(t)}(?!\w)', re.I)
+        if rx.search(text):
+            return t
+    # Reddit also matched on stemming / flair we can't see: report the whole chunk ("a|b|c"),
+    # so matched_event / matched_age are always strings
+    return "|".join(terms)
+
+async def run_query(sub, events, ages, limit, sem, limiter):
+    q = build_query(events, ages)
+    for attempt in range(MAX_429_RETRIES + 1):
+        try:
+            async with sem:
+                posts = []
+                await limiter.acquire()
+                # Sort by new to more quickly bump into older posts; adjust as needed
+                async for post in sub.search(q, sort="new", time_filter="all", limit=limit):
+                    posts.append(post)
+                    if len(posts) % LISTING_PAGE == 0 and len(posts) < limit:
+                        await limiter.acquire()  # the next item fetches another page
+            return events, ages, posts
+        except TooManyRequests:
+            if attempt == MAX_429_RETRIES:
+                raise
+            # back off outside the semaphore so other queries keep their slots
+            delay = min(2 ** attempt + random.random(), 60)
+            print(f"[warn] 429 on query {events[0]!r}/{ages[0]!r}; retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+async def search_terms(subs, events, ages, limit_per_pair=PER_PAIR_LIMIT, cutoff_date="2025-11-01", seen_ids=None):
     cutoff_ts = datetime.datetime.fromisoformat(cutoff_date).timestamp()
-    seen_ids = set()
-    sub = reddit.subreddit(subs)
-
-    for event, age in itertools.product(events, ages):
-        q = build_query(event, age)
-        # Sort by new to more quickly bump into older posts; adjust as needed
-        for post in sub.search(q, sort="new", time_filter="all", limit=limit_per_query):
-            if post.id in seen_ids:
-                continue
-            if post.created_utc >= cutoff_ts:
-                seen_ids.add(post.id)
-                yield {
-                    "id": post.id,
-                    "title": post.title,
-                    "selftext": post.selftext or "",
-                    "created_utc": post.created_utc,
-                    "permalink": post.permalink,
-                    "subreddit": str(post.subreddit),
-                    "score": post.score,
-                    "num_comments": post.num_comments,
-                    "matched_event": event,
-                    "matched_age": age
-                }
-        # Be nice to the API if you’re doing lots of queries
-        time.sleep(1.1)
+    seen_ids = set() if seen_ids is None else seen_ids  # pass the persisted set to skip earlier runs' posts
+    sem = asyncio.Semaphore(CONCURRENCY)
+    limiter = AsyncLimiter(*RATE_LIMIT)
+
+    async with make_reddit() as reddit:
+        sub = await reddit.subreddit(subs)
+        queries = [
+            run_query(sub, ev_chunk, age_chunk, min(limit_per_pair * len(ev_chunk) * len(age_chunk), MAX_LISTING),
+                      sem, limiter)
+            for ev_chunk, age_chunk in itertools.product(_chunks(events, EVENT_CHUNK), _chunks(ages, AGE_CHUNK))
+        ]
+        # Results are consumed here, one query at a time as each finishes,
+        # so seen_ids needs no lock.
+        for fut in asyncio.as_completed(queries):
+            ev_chunk, age_chunk, posts = await fut
+            for post in posts:
+                if post.id in seen_ids:
+                    continue
+                if post.created_utc >= cutoff_ts:
+                    seen_ids.add(post.id)
+                    text = f"{post.title} {post.selftext or ''}"
+                    yield {
+                        "id": post.id,
+                        "title": post.title,
+                        "selftext": post.selftext or "",
+                        "created_utc": post.created_utc,
+                        "permalink": post.permalink,
+                        "subreddit": str(post.subreddit),
+                        "score": post.score,
+                        "num_comments": post.num_comments,
+                        "matched_event": first_match(text, ev_chunk),
+                        "matched_age": first_match(text, age_chunk)
+                    }
 
 # ------------ minimal privacy scrub (best-effort, not perfect) ------------
 _EMAIL_RE = re.compile(r'\b[a-z0-9._%+-]+@[a-z0-9.-]+\.[a-z]{2,}\b', re.I)
 _PHONE_RE = re.compile(r'(?<!\d)(?:\+?\d[\s-]?){6,15}\d(?!\d)')   # broad intl matcher
 _URL_RE   = re.compile(r'(https?://\S+|www\.\S+)', re.I)
 _HANDLE_RE= re.compile(r'(?<!\w)@[A-Za-z0-9_]{2,}', re.I)
+_DIGIT_RE = re.compile(r'\d')
 
 def scrub_text(t: str) -> str:
     if not t:
         return ""
-    t = _EMAIL_RE.sub("[redacted-email]", t)
-    t = _PHONE_RE.sub("[redacted-phone]", t)
+    # Passes run in this order on purpose (each sees the previous one's output, e.g. the handle
+    # pass never eats an email's "@domain"). A pass is skipped only when its pattern cannot match:
+    # the markers contain no "@" or digits, so the checks stay valid after earlier replacements.
+    has_at = "@" in t
+    if has_at:
+        t = _EMAIL_RE.sub("[redacted-email]", t)
+    if _DIGIT_RE.search(t):
+        t = _PHONE_RE.sub("[redacted-phone]", t)
     t = _URL_RE.sub("[redacted-url]", t)
-    t = _HANDLE_RE.sub("[redacted-handle]", t)
+    if has_at and "@" in t:
+        t = _HANDLE_RE.sub("[redacted-handle]", t)
     return t
 
 def sanitise_row(row: dict) -> dict:
@@ -100,41 +182,119 @@ def sanitise_row(row: dict) -> dict:
     return kept
 
 
-# ------------ JSONL.gz appender with atomic write ------------
-def append_jsonl_gz(record: dict, out_path: str):
+# ------------ JSONL.gz writer (one handle per run) ------------
+def complete_gzip_length(path: Path) -> int:
+    """Bytes taken by the leading run of complete gzip members (a hard kill can tear the last one)."""
+    good = pos = 0
+    d = zlib.decompressobj(wbits=31)
+    with open(path, "rb") as f:
+        while chunk := f.read(1 << 20):
+            while chunk:
+                try:
+                    d.decompress(chunk)
+                except zlib.error:  # not gzip from here on: keep what was whole
+                    return good
+                if not d.eof:
+                    pos += len(chunk)
+                    break
+                pos += len(chunk) - len(d.unused_data)
+                good = pos
+                chunk = d.unused_data
+                d = zlib.decompressobj(wbits=31)
+    return good
+
+class JsonlGzWriter:
     """
     Append one JSON object per line (newline-delimited) to a gzipped file.
-    Uses a small temp file and os.replace to avoid partial writes on crashes.
+    The file handle stays open for the whole run. Every FSYNC_EVERY records the current gzip
+    member is closed (trailer written) and fsynced, so the file on disk is always valid gzip
+    up to the last sync; a hard kill (SIGKILL, power loss) can only tear the member after it.
+    On open, such a torn tail from an earlier run is cut off before appending, so at most
+    FSYNC_EVERY records are lost and the readers never meet a truncated stream.
     """
-    out_path = Path(out_path)
-    out_path.parent.mkdir(parents=True, exist_ok=True)
-    line = json.dumps(record, ensure_ascii=False) + "\n"
-
-    # Write to a tiny temp gz and concatenate safely to the target
-    with tempfile.NamedTemporaryFile("wb", delete=False, dir=str(out_path.parent)) as tmp:
-        tmp_name = tmp.name
-        with gzip.GzipFile(fileobj=tmp, mode="wb", mtime=0) as gz:
-            gz.write(line.encode("utf-8"))
-
-    # If the target doesn't exist yet, just move temp into place.
-    # If it exists, append the bytes (binary concat of gzip members is valid).
-    if not out_path.exists():
-        shutil.move(tmp_name, out_path)
-    else:
-        with open(out_path, "ab") as fout, open(tmp_name, "rb") as fin:
-            shutil.copyfileobj(fin, fout)
-        Path(tmp_name).unlink(missing_ok=True)
+    FSYNC_EVERY = 200
+
+    def __init__(self, out_path: str, compresslevel: int = 6):
+        self.out_path = Path(out_path)
+        self.compresslevel = compresslevel
+        self.count = 0
+        self.synced = 0  # records known to be on disk
+        self.gz = None
+
+    def __enter__(self):
+        self.out_path.parent.mkdir(parents=True, exist_ok=True)
+        self._fp = open(self.out_path, "ab")
+        size = self._fp.tell()
+        if size:
+            good = complete_gzip_length(self.out_path)
+            if good < size:
+                print(f"[warn] {self.out_path.name}: dropping {size - good} bytes of an interrupted write")
+                self._fp.truncate(good)
+        return self
+
+    def write(self, record: dict):
+        if self.gz is None:  # members start lazily, so a sync never leaves an empty one
+            self.gz = gzip.GzipFile(fileobj=self._fp, mode="ab", compresslevel=self.compresslevel, mtime=0)
+        if orjson is not None:
+            self.gz.write(orjson.dumps(record, option=orjson.OPT_APPEND_NEWLINE))
+        else:
+            self.gz.write((json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8"))
+        self.count += 1
+        if self.count % self.FSYNC_EVERY == 0:
+            self.sync()
+
+    def sync(self):
+        if self.gz is not None:
+            self.gz.close()  # ends the member; the underlying file stays open
+            self.gz = None
+        self._fp.flush()
+        os.fsync(self._fp.fileno())
+        self.synced = self.count
+
+    def __exit__(self, *exc):
+        self.sync()
+        self._fp.close()
+
+# ------------ ids saved by earlier runs ------------
+def open_seen_ids(path: str):
+    """Open (or create) the persistent id table; returns the connection and the ids as a set."""
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE IF NOT EXISTS ids (id TEXT PRIMARY KEY)")
+    return conn, {row[0] for row in conn.execute("SELECT id FROM ids")}
 
 # ------------ choose an output file name ------------
 RUN_STAMP = datetime.datetime.utcnow().strftime("%Y%m%d")
 OUTFILE = f"data/raw/reddit_child_injury_{RUN_STAMP}.jsonl.gz"
+SEEN_DB = "data/raw/seen_ids.sqlite"  # delete to re-crawl everything
 
 # Run it (stream -> print -> append)
-saved = 0
-for i, row in enumerate(search_terms(SUBS, EVENTS, AGES, limit_per_query=10, cutoff_date="2025-11-01"), 1):
-    safe = sanitise_row(row)
-    print(i, safe["subreddit"], safe["title"], safe["selftext"][:120].replace("\n"," ") + ("..." if len(safe["selftext"]) > 120 else ""))
-    append_jsonl_gz(safe, OUTFILE)
-    saved += 1
-
-print(f"\nSaved {saved} records to {OUTFILE}")
+async def main():
+    saved = 0
+    i = 0
+    db, seen = open_seen_ids(SEEN_DB)
+    print(f"{len(seen)} ids already saved by earlier runs")
+    out = JsonlGzWriter(OUTFILE)
+    try:
+        with out:
+            async for row in search_terms(SUBS, EVENTS, AGES, limit_per_pair=PER_PAIR_LIMIT, cutoff_date="2025-11-01", seen_ids=seen):
+                i += 1
+                safe = sanitise_row(row)
+                print(i, safe["subreddit"], safe["title"], safe["selftext"][:120].replace("\n"," ") + ("..." if len(safe["selftext"]) > 120 else ""))
+                out.write(safe)
+                db.execute("INSERT OR IGNORE INTO ids VALUES (?)", (safe["id"],))
+                saved += 1
+                # ids are committed only once their records are synced, so a crash re-fetches them
+                if out.count % out.FSYNC_EVERY == 0:
+                    db.commit()
+    finally:
+        # out is closed by now: if its final sync went through (even when the crawl itself
+        # failed), every pending id is on disk and is kept; otherwise they roll back
+        if out.synced == out.count:
+            db.commit()
+        db.close()
+
+    print(f"\nSaved {saved} records to {OUTFILE}")
+
+if __name__ == "__main__":
+    asyncio.run(main())